@@ -1,16 +1,170 @@
 import serial
 import serial.tools.list_ports
 
+import math
+import re
 import time
+import threading
+from array import array
+from collections import deque
 import numpy as np
 
+try:
+    from numba import njit
+except ImportError:   # numba is optional, without it the NumPy code below is used on its own
+    njit = None
+
+_FRAME = re.compile(rb'(\d+) (\d+) (\d+) (\d+)\s*')  # full, ir, time in milliseconds, gain
+_MAX_INTENSITY = 0xFFFF  # the Arduino sends the intensities as uint16
+_MAX_MILLIS = 0xFFFFFFFF  # and the time as a uint32 count of milliseconds
+
+_INITIAL_CAPACITY = 1024  # number of values the buffers can hold before they need to grow
+_FRAME_RATE = 10  # frames sent by the Arduino each second, at most, used to size the buffers
+_READ_TIMEOUT = 0.05  # seconds the reader thread waits for data before checking whether the collection is over
+
+_GAIN_CODES = {b'0': 0, b'16': 1, b'32': 2, b'48': 3}  # gain values sent by the Arduino, mapped to table indices
+_GAIN_NAMES = np.array(['LOW', 'MED', 'HIGH', 'MAX'])
+_GAIN_DIV = np.array([1.0, 25.0, 428.0, 9876.0])  # gain multipliers to divide out of the raw values
+_GAIN_INV = 1.0 / _GAIN_DIV  # reciprocals, so removing the gain is a multiplication
+_INT_ERR = 0.5 / _GAIN_DIV  # rounding error of the integers sent by the Arduino, for each gain
+_GAIN_TABLE = {gain.decode(): (str(_GAIN_NAMES[code]), float(_GAIN_INV[code])) for gain, code in _GAIN_CODES.items()}  # name and reciprocal multiplier of each gain, for converting single readings
+_GAIN_LOOKUP = np.array([_GAIN_CODES.get(b'%d' % gain, -1) for gain in range(max(map(int, _GAIN_CODES)) + 1)], dtype=np.int8)  # gain value to table index, -1 for unknown gains
+
+def _meanVariance(values, scratch):
+    """Return the mean and the sample variance of an array of values, accumulated in float64.
+    
+    The deviations from the mean are written into scratch, an array of the same length, rather
+    than into a newly allocated one. With fewer than two values the variance is NaN, as from np.std
+    with ddof=1, and with none the mean is NaN as well.
+    """
+    
+    if len(values) < 2:
+        return (values.mean(dtype=np.float64) if len(values) else np.nan), np.nan
+    
+    mean = values.mean(dtype=np.float64)
+    deviations = np.subtract(values, mean, out=scratch)
+    return mean, np.dot(deviations, deviations) / (len(values) - 1)
+
+if njit is not None:
+    @njit(cache=True, error_model='numpy')
+    def _subtractStats(full, ir, vis, gains, interr, bfull, bir, bvis):
+        """Subtract the backgrounds from the spectra in place and return their statistics.
+        
+        This is done in a single pass over the values. The mean and the sum of squared deviations of
+        each spectrum are updated as each value is visited (Welford's method), and the rounding error of
+        the gain each value was recorded with is added up alongside them. With no values every result
+        is NaN, and with one value the variances are, as they are from _meanVariance.
+        
+        returns:
+        stats (tuple): A (mean, variance) pair for each of the full, ir and visible values
+        interr (float): The rounding error of the values, averaged over the trial
+        """
+        
+        n = full.shape[0]
+        if n == 0:
+            return ((np.nan, np.nan), (np.nan, np.nan), (np.nan, np.nan)), np.nan
+        
+        spectra = (full, ir, vis)
+        backgrounds = (bfull, bir, bvis)
+        means = np.zeros(3)
+        m2s = np.zeros(3)
+        errsum = 0.0
+        for i in range(n):
+            for k in range(3):
+                values = spectra[k]
+                x = values[i] - backgrounds[k]
+                values[i] = x
+                delta = x - means[k]
+                means[k] += delta / (i + 1)
+                m2s[k] += delta * (x - means[k])
+            errsum += interr[gains[i]]
+        
+        stats = ((means[0], m2s[0] / (n - 1)), (means[1], m2s[1] / (n - 1)), (means[2], m2s[2] / (n - 1)))
+        return stats, errsum / n
+
+    @njit(cache=True)
+    def _parseBlock(block, lookup, full, ir, millis, gains):
+        """Parse a block of newline terminated frames straight into arrays of raw values.
+        
+        This does the same checks as _parseFrame, walking the bytes one at a time: a frame must be
+        four numbers separated by single spaces, optionally followed by whitespace, the values must be
+        in the range the Arduino sends, and the gain must be known to the lookup table, written without
+        leading zeros. Frames that fail are skipped. The output arrays must have room for one value per
+        newline in the block.
+        
+        returns:
+        count (int): The number of frames stored into the arrays
+        dropped (int): The number of frames skipped
+        """
+        
+        count = 0
+        dropped = 0
+        fields = np.empty(3, dtype=np.int64)
+        start = 0
+        for newline in range(block.shape[0]):
+            if block[newline] != 10:
+                continue
+            
+            end = newline
+            while end > start and (block[end - 1] == 32 or 9 <= block[end - 1] <= 13):   # trailing whitespace
+                end -= 1
+            
+            field = 0
+            digits = 0
+            value = 0
+            leadingzero = False
+            valid = True
+            for i in range(start, end):
+                c = block[i]
+                if 48 <= c <= 57:   # a digit
+                    if digits == 0:
+                        leadingzero = c == 48
+                    value = value * 10 + (c - 48)
+                    digits += 1
+                    if value > _MAX_MILLIS:   # too large for any field, stopped before it can overflow
+                        valid = False
+                        break
+                elif c == 32 and digits > 0 and field < 3:   # the space between two numbers
+                    if field < 2 and value > _MAX_INTENSITY:
+                        valid = False
+                        break
+                    fields[field] = value
+                    field += 1
+                    digits = 0
+                    value = 0
+                else:
+                    valid = False
+                    break
+            start = newline + 1
+            
+            if not valid or field != 3 or digits == 0 or (leadingzero and digits > 1):
+                dropped += 1
+                continue
+            if value >= lookup.shape[0] or lookup[value] < 0:
+                dropped += 1
+                continue
+            
+            full[count] = fields[0]
+            ir[count] = fields[1]
+            millis[count] = fields[2]
+            gains[count] = lookup[value]
+            count += 1
+        
+        return count, dropped
+
+def _windowSums(values, window):
+    """Return the sum of every run of window consecutive values, from one cumulative sum."""
+    
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    return cumulative[window:] - cumulative[:-window]
+
 class LightSensor:
     
     """Use a light sensor to gather intensity values.
     
     This class uses a light sensor connected to an Arduino and utilizing a serial port to gather 
     and process light intensity data. This class takes raw data from the Arduino which is stored 
-    into lists which can be analyzed by getting the averages and the errors of gather values. This
+    into buffers which can be analyzed by getting the averages and the errors of gather values. This
     class can record and remove any background intensity data automatically. The class can also provide
     the gain value associated with every value sent from the sensor and automatically removes any
     gain multiplier. The class provided the multiplier values which can be used to adjust any recieved 
@@ -23,11 +177,12 @@ class LightSensor:
     bferr (float): A variable for the full spectrum background error value, set to zero.
     bierr (float): A variable for the ir spectrum background error value, set to zero.
     bverr (float): A variable for the visible spectrum background error value, set to zero.
-    fullvals (list): Empty list to contain the full spectrum values.
-    irvals (list): Empty list to contain the ir spectrum values.
-    visvals (list): Empty list to contain the vis spectrum values.
-    timevals (list): Empty list to contain the time values.
-    gainhist (list): Empty list to contain the full gain values.
+    fullvals (ndarray): The full spectrum values of the most recent collection.
+    irvals (ndarray): The ir spectrum values of the most recent collection.
+    visvals (ndarray): The vis spectrum values of the most recent collection.
+    timevals (ndarray): The time values of the most recent collection.
+    gainhist (ndarray): The names of the gain values of the most recent collection.
+    dropped (int): The number of frames that could not be read in the most recent collection.
     
     """
     
@@ -36,18 +191,56 @@ class LightSensor:
 
         self.ser = 'NONE'  # creates a variable for the serial port
         
-        self.bfull = 0   # variables for the background values
-        self.bir = 0
-        self.bvis = 0
+        self.bfull = np.float64(0)   # variables for the background values
+        self.bir = np.float64(0)
+        self.bvis = np.float64(0)
         self.bferr = 0
         self.bierr = 0
         self.bverr = 0
         
-        self.fullvals = []   # lists for all intesity values
-        self.irvals = []
-        self.visvals = []
-        self.timevals = []
-        self.gainhist = []  # history of gain values
+        self.dropped = 0   # number of frames that could not be read in the last collection
+        
+        self._n = 0   # number of values currently stored in the buffers
+        self._full = np.empty(_INITIAL_CAPACITY)   # pre-allocated buffers for all intesity values
+        self._ir = np.empty(_INITIAL_CAPACITY)
+        self._vis = np.empty(_INITIAL_CAPACITY)
+        self._time = np.empty(_INITIAL_CAPACITY)
+        self._gain = np.empty(_INITIAL_CAPACITY, dtype=np.uint8)  # history of gain values, as table indices
+        self._scratch = np.empty(_INITIAL_CAPACITY)  # reused for intermediate results of the statistics
+        self._epoch = 0   # counts changes to the stored values
+        self._cache = {}  # results computed from the stored values, with the epoch they were computed at
+        
+        self._rawfull = array('q')   # raw values from the Arduino, collected before the gain is removed
+        self._rawir = array('q')
+        self._rawtime = array('q')
+        self._rawgain = array('B')
+        
+        self._rxbuf = bytearray()  # bytes received from the serial port that are not yet a full frame
+    
+    @property
+    def fullvals(self):
+        """The full spectrum values currently stored in the buffer."""
+        return self._full[:self._n]
+    
+    @property
+    def irvals(self):
+        """The ir spectrum values currently stored in the buffer."""
+        return self._ir[:self._n]
+    
+    @property
+    def visvals(self):
+        """The visible spectrum values currently stored in the buffer."""
+        return self._vis[:self._n]
+    
+    @property
+    def timevals(self):
+        """The time values currently stored in the buffer."""
+        return self._time[:self._n]
+    
+    @property
+    def gainhist(self):
+        """The names of the gain values currently stored in the buffer."""
+        return _GAIN_NAMES[self._gain[:self._n]]
         
     def getPortName(self):
         """List out avaliable ports on device.
@@ -66,13 +259,20 @@ class LightSensor:
         This function declares the port being used on the device by both the Arduino board and
         the device. Therefore, the port used must be the same as the Arduino board. The port
         is declared by a parameter controled by the user, which should match one of the printed
-        port names from the getPortName function.
+        port names from the getPortName function. Opening the port restarts the Arduino board, so
+        this function waits for it to start up and then discards whatever it sent while doing so.
         
         portName (str): Name of the port the sensor uses.
         """
         
         self.ser = serial.Serial(portName, 9600)
         self.ser.timeout = 2
+        try:
+            self.ser.set_buffer_size(rx_size = 65536)  # room for long batches between reads, only avaliable on Windows
+        except AttributeError:
+            pass
+        time.sleep(2)   # lets the Arduino finish restarting
+        self.ser.reset_input_buffer()
         
     def closePort(self):
         """Close the currently open serial port.
@@ -103,15 +303,76 @@ class LightSensor:
         gainstr (str): The string value for the gain
         """
         
-        lightstr = self.ser.readline().decode('utf-8')
-        fullstr, irstr, timestr, gainstr = lightstr.rstrip().split(sep = ' ')
-        full = int(fullstr)
-        ir = int(irstr)
-        time = int(timestr)  # in milliseconds
-        visible = full - ir
-        seconds = time / 1000
+        full, ir, millis, gainbytes = self._parseFrame(self.ser.readline())
+        return full, ir, full - ir, millis / 1000, gainbytes.decode('ascii')
+    
+    def _readFrames(self):
+        """Read every complete frame currently waiting on the serial port.
+        
+        This function drains all the bytes the serial port has received so far with a single read,
+        rather than one read per frame, and splits them into frames on the newline sent by the Arduino.
+        Any partial frame at the end is kept and completed by the next call.
+        
+        returns:
+        frames (list): The complete frames received, as bytearrays
+        """
+        
+        self._rxbuf += self.ser.read(self.ser.in_waiting or 1)  # waits for at least one byte, or until the timeout
+        
+        frames = self._rxbuf.split(b'\n')   # splits the whole batch at once
+        self._rxbuf = frames.pop()   # the last piece is a partial frame, or empty
+        
+        return frames
+    
+    def _readInBackground(self, frames, stop, errors):
+        """Read frames from the serial port until told to stop.
+        
+        This function runs on its own thread during a collection, so the serial port keeps being read
+        while the frames already received are being processed. The thread ends early if the connection
+        to the Arduino is lost. Any other error ends the thread as well and is handed back to the
+        collection, which raises it once the thread has finished.
+        
+        frames (deque): Where the complete frames received are added
+        stop (Event): Set once the collection is over
+        errors (list): Where an unexpected error is added
+        """
+        
+        try:
+            while not stop.is_set():
+                frames.extend(self._readFrames())
+        except OSError:
+            pass   # includes SerialException, the collection sees that this thread has ended
+        except BaseException as error:
+            errors.append(error)
+    
+    def _parseFrame(self, frame):
+        """Split a single frame from the Arduino into its values.
+        
+        The frame is matched and converted as raw bytes, since the Arduino only sends ascii digits
+        and there is no need to decode it into a string first. A frame that is not exactly four
+        numbers, such as two frames run together by line noise, or that holds a value larger than the
+        Arduino can send, raises a ValueError.
+        
+        frame (bytes): One line sent by the Arduino
+        
+        returns:
+        full (int): The full spectrum value from the Arduino
+        ir (int): The ir spectrum value from the Arduino
+        millis (int): The time value in milliseconds from the Arduino
+        gainbytes (bytes): The bytes value for the gain
+        """
         
-        return full, ir, visible, seconds, gainstr
+        match = _FRAME.fullmatch(frame)
+        if match is None:
+            raise ValueError('malformed frame: %r' % frame)
+        fullbytes, irbytes, timebytes, gainbytes = match.groups()
+        full = int(fullbytes)
+        ir = int(irbytes)
+        millis = int(timebytes)
+        if full > _MAX_INTENSITY or ir > _MAX_INTENSITY or millis > _MAX_MILLIS:
+            raise ValueError('value out of range in frame: %r' % frame)
+        
+        return full, ir, millis, gainbytes
     
     def convertGain(self, gainstr, fullval, irval, visval):
         """Convert the string value of the gain from the Arduino.
@@ -133,29 +394,14 @@ class LightSensor:
         visible (float): The visible spectrum value with the gain multiplier divided out
         """
         
-        if gainstr == '48':
-            gain = 'MAX'
-            full = fullval / 9876
-            ir = irval / 9876
-            visible = visval / 9876
-            
-        elif gainstr == '32':
-            gain = 'HIGH'
-            full = fullval / 428
-            ir = irval / 428
-            visible = visval / 428
-            
-        elif gainstr == '16':
-            gain = 'MED'
-            full = fullval / 25
-            ir = irval / 25
-            visible = visval / 25
-            
-        elif gainstr == '0':
-            gain = 'LOW'
-            full = fullval
-            ir = irval
-            visible = visval
+        try:
+            gain, scale = _GAIN_TABLE[gainstr]
+        except KeyError:
+            raise ValueError('unknown gain value: %r' % gainstr) from None
+        
+        full = fullval * scale
+        ir = irval * scale
+        visible = visval * scale
 
         return gain, full, ir, visible
     
@@ -172,7 +418,7 @@ class LightSensor:
         print('MED: 25')
         print('LOW: 1')
     
-    def setBackground(self, integratetime):
+    def setBackground(self, integratetime, verbose=True):
         """Take readings of the background light intesity for a parameter of time.
         
         This function collects intensity values over a parameter of time in seconds and then calculates
@@ -180,10 +426,11 @@ class LightSensor:
         lighting to account for influencing intensity.
     
         integratetime (int): Variable for how long a trial should run.
+        verbose (bool): Whether to print progress messages while collecting.
         """  
         
-        self.read(integratetime)
-        self.bfull, self.bir, self.bvis = self.average()
+        self.read(integratetime, verbose)
+        self.bfull, self.bir, self.bvis = (np.float64(value) for value in self.average())  # ready to subtract from the buffers
         self.bferr, self.bierr, self.bverr = self.totalError()    
     
     def resetBackground(self):
@@ -193,67 +440,192 @@ class LightSensor:
         any background intensities.
         """
         
-        self.bfull = 0
-        self.bir = 0
-        self.bvis = 0
+        self.bfull = np.float64(0)
+        self.bir = np.float64(0)
+        self.bvis = np.float64(0)
         self.bferr = 0
         self.bierr = 0
         self.bverr = 0
     
-    def read(self, integratetime):
+    def read(self, integratetime, verbose=True):
         """Collect intensity readings over a parameter of time.
         
         This function collects intensity values using the sensor over a parameter of time. The values
-        are stored into the list variables for this class and the variables are cleared each time
-        this function is called. This function also tries to catch any error that can occur when using
-        serial communication.
+        are stored into the buffers for this class and the buffers are cleared each time
+        this function is called. Frames that cannot be read are dropped and counted, and the collection
+        stops early if the connection to the Arduino is lost. Any other error is raised to the user.
         
         integratetime (int): Variable for how long a trial should run.
+        verbose (bool): Whether to print progress messages while collecting.
         """
         
-        self.ser.flushInput() # flushes the Arduino of extra values
-        self.listclear()   # clears the list automatically everytime collect is called
+        self.ser.reset_input_buffer() # flushes the Arduino of values sent before this trial
+        self._rxbuf.clear()
+        self.listclear()   # clears the buffers automatically everytime collect is called
+        self._reserve(int(integratetime * _FRAME_RATE) + 64)  # sizes the buffers for the whole trial up front
+        for raw in (self._rawfull, self._rawir, self._rawtime, self._rawgain):
+            del raw[:]
         
-        start = time.time()  # for use in controling how long the loop collects data
-        currenttime = time.time()
-        end = (start + integratetime)
+        end = time.monotonic() + integratetime  # for use in controling how long the loop collects data
+        self.dropped = 0   # number of frames that could not be read
     
-        print("Intensity values being collected...")
+        if verbose:
+            print("Intensity values being collected...")
 
-        while currenttime < end: 
-            try:
-                fullval, irval, visval, seconds, gainstr = self.sensorRead()  # reads values from the Arduino
-                gain, full, ir, visible = self.convertGain(gainstr, fullval, irval, visval)
+        frames = deque()   # frames received by the reader thread, waiting to be processed
+        stop = threading.Event()
+        errors = []   # an unexpected error from the reader thread
+        reader = threading.Thread(target=self._readInBackground, args=(frames, stop, errors), daemon=True)
+        timeout = self.ser.timeout
+        self.ser.timeout = _READ_TIMEOUT   # so the reader sees the end of the collection soon after it is set
+        reader.start()
+        
+        try:
+            monotonic = time.monotonic   # looked up once rather than on every pass
+            popleft = frames.popleft
+            now = monotonic()
+            while now < end: 
+                batch = [popleft() for _ in range(len(frames))]   # only this thread takes frames out
+                if batch:
+                    self._storeFrames(batch)
                 
-                self.fullvals.append(full)  # stores all values into the list variables
-                self.irvals.append(ir)
-                self.visvals.append(visible)
-                self.timevals.append(seconds)
-                self.gainhist.append(gain)
-        
-                t = end - currenttime
-                currenttime = time.time()
+                if not reader.is_alive():   # Someone just unplugged the device, or other loss of communication.
+                    if errors:
+                        break   # raised below, once the reader has finished
+                    print("Lost connection to device, exiting.")
+                    self._rxbuf.clear()   # any partial frame left will never be completed
+                    break
+                
+                time.sleep(min(end - now, 0.01))   # gives the reader time to receive more frames, without passing the end
+                now = monotonic()
+        
+        finally:
+            stop.set()
+            reader.join()
+            self.ser.timeout = timeout
+        
+        if errors:
+            raise errors[0]
+        if frames:
+            self._storeFrames(list(frames))   # frames received after the last pass of the loop
+        
+        self._fillBuffers()
+        
+        if verbose:
+            if self.dropped:
+                print("%d frames could not be read and were dropped." % self.dropped)
+            print("Intensity values collected successfully.")
+        
+    
+    def _storeFrames(self, frames):
+        """Parse a batch of frames and store their raw values.
+        
+        When numba is avaliable, the whole batch is joined into one block of bytes and parsed by a
+        compiled function. Otherwise each frame is parsed with _parseFrame. Frames that cannot be read
+        are dropped and counted either way.
+        
+        frames (list): The frames received from the Arduino
+        """
+        
+        if njit is not None:
+            block = np.frombuffer(b'\n'.join(frames) + b'\n', dtype=np.uint8)
+            full = np.empty(len(frames), dtype=np.int64)
+            ir = np.empty(len(frames), dtype=np.int64)
+            millis = np.empty(len(frames), dtype=np.int64)
+            gains = np.empty(len(frames), dtype=np.uint8)
+            count, dropped = _parseBlock(block, _GAIN_LOOKUP, full, ir, millis, gains)
             
-            except ValueError:      # error at float conversion
-                print("Conversion error: frame dropped, continuing collection.")
-                continue
-
-            except IndexError:      # not all values received for a measurement set
-                print("Partial frame received: frame dropped, continuing collection.")
+            self.dropped += dropped
+            self._extendRaw(full[:count], ir[:count], millis[:count], gains[:count])
+            return
+        
+        parse = self._parseFrame   # looked up once rather than for every frame
+        gaincodes = _GAIN_CODES
+        appendgain = self._rawgain.append
+        appendfull = self._rawfull.append
+        appendir = self._rawir.append
+        appendtime = self._rawtime.append
+        dropped = 0
+        
+        for frame in frames:
+            try:
+                fullval, irval, millis, gainbytes = parse(frame)
+                gaincode = gaincodes[gainbytes]
+            
+            except (ValueError, KeyError):      # partial or garbled frame, or an unknown gain
+                dropped += 1
                 continue
-
-            except serial.serialutil.SerialException: # Someone just unplugged the device, or other loss of communication.
-                print("Lost connection to device, exiting.")
-                break
-
-            except:     # Catch-all
-                print("Unknown error! Exiting program...")
-                break
+            
+            appendfull(fullval)  # stores the raw integers, unboxed
+            appendir(irval)
+            appendtime(millis)
+            appendgain(gaincode)  # last, as the number of gains is the number of frames stored
+        
+        self.dropped += dropped
+    
+    def _extendRaw(self, full, ir, millis, gains):
+        """Add arrays of parsed values to the raw values of the collection.
+        
+        The values are copied in as raw bytes, without creating a Python object for each of them.
+        
+        full (ndarray): The full spectrum values, as int64
+        ir (ndarray): The ir spectrum values, as int64
+        millis (ndarray): The time values in milliseconds, as int64
+        gains (ndarray): The indices of the gain values in the gain tables
+        """
+        
+        self._rawfull.frombytes(full.astype(np.int64).tobytes())
+        self._rawir.frombytes(ir.astype(np.int64).tobytes())
+        self._rawtime.frombytes(millis.astype(np.int64).tobytes())
+        self._rawgain.frombytes(gains.astype(np.uint8).tobytes())  # last, as the number of gains is the number of frames stored
+    
+    def _reserve(self, size):
+        """Make sure the buffers can hold a number of values.
         
-        print("Intensity values collected successfully.")
+        When the buffers are too small their capacity is doubled until the values fit. The values
+        already stored are not kept, so this is only used before the buffers are filled.
         
+        size (int): The number of values the buffers must be able to hold.
+        """
+        
+        capacity = len(self._full)
+        while capacity < size:
+            capacity *= 2
+        if capacity != len(self._full):
+            self._full = np.empty(capacity)
+            self._ir = np.empty(capacity)
+            self._vis = np.empty(capacity)
+            self._time = np.empty(capacity)
+            self._gain = np.empty(capacity, dtype=np.uint8)
+            self._scratch = np.empty(capacity)
+    
+    def _fillBuffers(self):
+        """Move the raw values of a collection into the buffers and divide out the gain.
+        
+        This function is used once a collection has finished. The raw values are viewed as NumPy
+        arrays without copying them, and every intensity value is divided by the multiplier of the
+        gain it was recorded with, all at once and straight into the buffers. As the gain usually stays
+        the same for a whole trial, that case is handled with a single multiplier.
+        """
+        
+        n = len(self._rawgain)
+        self._reserve(n)   # only needed when more values arrived than expected
+        
+        self._n = n
+        self._gain[:n] = np.frombuffer(self._rawgain, dtype=np.uint8)
+        np.divide(np.frombuffer(self._rawtime, dtype=np.int64), 1000, out=self._time[:n])  # in seconds
+        
+        gains = self._gain[:n]
+        if n and (gains == gains[0]).all():   # the gain never changed, so one multiplier covers every value
+            scale = _GAIN_INV[gains[0]]
+        else:
+            scale = _GAIN_INV[gains]
+        np.multiply(np.frombuffer(self._rawfull, dtype=np.int64), scale, out=self._full[:n])
+        np.multiply(np.frombuffer(self._rawir, dtype=np.int64), scale, out=self._ir[:n])
+        np.subtract(self._full[:n], self._ir[:n], out=self._vis[:n])  # visible is full - ir
+        self._epoch += 1
     
-    def collectData(self, integratetime):
+    def collectData(self, integratetime, verbose=True):
         """Take collected data and remove the background intensity values.
         
         This is the main function being called by the user. This function uses the collect function
@@ -261,23 +633,62 @@ class LightSensor:
         values present. The function then prints out the calculated averages and errors.
     
         integratetime (int): Variable for how long a trial should run.
+        verbose (bool): Whether to print progress messages while collecting.
         """
         
-        self.read(integratetime)
+        self.read(integratetime, verbose)
             
-        for i in range(len(self.fullvals)):
-            self.fullvals[i] -= self.bfull
-        for i in range(len(self.irvals)):
-            self.irvals[i] -= self.bir
-        for i in range(len(self.visvals)):
-            self.visvals[i] -= self.bvis
+        if njit is None:
+            np.subtract(self.fullvals, self.bfull, out=self.fullvals)   # removes the background from every value at once
+            np.subtract(self.irvals, self.bir, out=self.irvals)
+            np.subtract(self.visvals, self.bvis, out=self.visvals)
+            self._epoch += 1
+        else:   # removes the background and calculates the averages and integer error in the same pass
+            stats, interr = _subtractStats(self.fullvals, self.irvals, self.visvals, self._gain[:self._n], _INT_ERR,
+                                           float(self.bfull), float(self.bir), float(self.bvis))
+            self._epoch += 1
+            self._cache['stats'] = (self._epoch, stats)
+            self._cache['interr'] = (self._epoch, interr)
         
         self.printAverage()  # prints out the Averages and errors
     
+    def _stats(self):
+        """Get the mean and variance of each spectrum.
+        
+        This function calculates the mean and the sample variance of the full, ir and visible values
+        and keeps them until the stored values change, so the averages and errors can all be taken
+        from one calculation instead of each going over the buffers again.
+        
+        returns:
+        stats (tuple): A (mean, variance) pair for each of the full, ir and visible values
+        """
+        
+        def compute():
+            scratch = self._scratch[:self._n]
+            return tuple(_meanVariance(values, scratch) for values in (self.fullvals, self.irvals, self.visvals))
+        
+        return self._cached('stats', compute)
+    
+    def _cached(self, name, compute):
+        """Get a result computed from the stored values, computing it only once for each change to them.
+        
+        name (str): The name the result is kept under
+        compute (function): Calculates the result when there is no up to date one
+        
+        returns:
+        result: The result of compute for the values currently stored
+        """
+        
+        epoch, result = self._cache.get(name, (None, None))
+        if epoch != self._epoch:
+            result = compute()
+            self._cache[name] = (self._epoch, result)
+        return result
+    
     def average(self):
-        """Take lists of spectra values and return the average.
+        """Take arrays of spectra values and return the average.
         
-        This function uses the list variables for the intensities and calculates the averages
+        This function uses the buffers for the intensities and calculates the averages
         of all the light spectrum values.
         
         returns:
@@ -286,27 +697,26 @@ class LightSensor:
         visavg (float): the average values of visible intensity values.
         """
         
-        fullavg = sum(self.fullvals) / len(self.fullvals)
-        iravg = sum(self.irvals) / len(self.irvals)
-        visavg = sum(self.visvals) / len(self.visvals)
+        (fullavg, _), (iravg, _), (visavg, _) = self._stats()
     
         return fullavg, iravg, visavg
     
     def standardDeviation(self):
         """Give the standard deviation of values.
         
-        This function uses the list variables for the intensities and calculates the standard deviation
+        This function uses the buffers for the intensities and calculates the standard deviation
         all the spectrum values.
         
         returns:
-        stdfull (float): the standard deviation of the full values list.
-        stdir (float): the standard deviation of the ir values list.
-        stdvis (float): the standard deviation of the visible values list.
+        stdfull (float): the standard deviation of the full values.
+        stdir (float): the standard deviation of the ir values.
+        stdvis (float): the standard deviation of the visible values.
         """
         
-        stdfull = np.std(self.fullvals, ddof=1)
-        stdir = np.std(self.irvals, ddof=1)
-        stdvis = np.std(self.visvals, ddof=1)
+        (_, varfull), (_, varir), (_, varvis) = self._stats()
+        stdfull = np.sqrt(varfull)
+        stdir = np.sqrt(varir)
+        stdvis = np.sqrt(varvis)
     
         return stdfull, stdir, stdvis
     
@@ -324,12 +734,65 @@ class LightSensor:
         """
         
         stdfull, stdir, stdvis = self.standardDeviation()
-        errfull = stdfull / np.sqrt(len(self.fullvals))
-        errir = stdir / np.sqrt(len(self.irvals))
-        errvis = stdvis / np.sqrt(len(self.visvals))
+        rootn = math.sqrt(self._n)  # every spectrum has the same number of values
+        errfull = stdfull / rootn
+        errir = stdir / rootn
+        errvis = stdvis / rootn
     
         return errfull, errir, errvis
     
+    def rollingAverage(self, window):
+        """Give the average of the values over a sliding window.
+        
+        This function calculates the average of every run of window consecutive values, so the change
+        in intensity over a trial can be followed. The averages come from a cumulative sum of the
+        values, so the cost does not depend on the size of the window.
+        
+        window (int): The number of values in each average.
+        
+        returns:
+        fullavg (ndarray): The rolling averages of the full spectrum values
+        iravg (ndarray): The rolling averages of the ir spectrum values
+        visavg (ndarray): The rolling averages of the visible spectrum values
+        """
+        
+        if not 1 <= window <= self._n:
+            raise ValueError('window must be between 1 and the number of values (%d)' % self._n)
+        
+        fullavg = _windowSums(self.fullvals, window) / window
+        iravg = _windowSums(self.irvals, window) / window
+        visavg = _windowSums(self.visvals, window) / window
+        
+        return fullavg, iravg, visavg
+    
+    def rollingStandardDeviation(self, window):
+        """Give the standard deviation of the values over a sliding window.
+        
+        This function calculates the standard deviation of every run of window consecutive values,
+        using cumulative sums of the values and of their squares. The values are taken relative to
+        the overall average first, which keeps the squares small and the result accurate.
+        
+        window (int): The number of values in each standard deviation, at least 2.
+        
+        returns:
+        stdfull (ndarray): The rolling standard deviations of the full spectrum values
+        stdir (ndarray): The rolling standard deviations of the ir spectrum values
+        stdvis (ndarray): The rolling standard deviations of the visible spectrum values
+        """
+        
+        if not 2 <= window <= self._n:
+            raise ValueError('window must be between 2 and the number of values (%d)' % self._n)
+        
+        stds = []
+        for values, (mean, _) in zip((self.fullvals, self.irvals, self.visvals), self._stats()):
+            centered = values - mean
+            sums = _windowSums(centered, window)
+            squares = _windowSums(centered * centered, window)
+            variance = (squares - sums * sums / window) / (window - 1)
+            stds.append(np.sqrt(np.maximum(variance, 0)))  # rounding can leave tiny negative variances
+        
+        return tuple(stds)
+    
     def integerError(self):
         """Give the error of the reported integer values from the Arduino.
         
@@ -337,7 +800,7 @@ class LightSensor:
         the gain. As the Arduino reports the intensities as integers there is a possibility that the
         value sent to the device is not quite accurate. The values could range from 0.5 above the recorded
         value to 0.5 below. The error is also divided by the gain multiplier to negate the influence of
-        gain.
+        gain, and is averaged over the gains of all the values in the trial.
         
         returns:
         fullerr (float): The error of the full spectrum values
@@ -345,24 +808,11 @@ class LightSensor:
         viserr (float): The error of the visible spectrum values
         """
         
-        for gain in self.gainhist:
-            if gain == 'LOW':
-                fullerr = 0.5
-                irerr = 0.5
-                viserr = 0.5
-            elif gain == 'MED':
-                fullerr = 0.5 / 25
-                irerr = 0.5 / 25
-                viserr = 0.5 / 25
-            elif gain == 'HIGH':
-                fullerr = 0.5 / 428
-                irerr = 0.5 / 428
-                viserr = 0.5 / 428
-            elif gain == 'MAX':
-                fullerr = 0.5 / 9876
-                irerr = 0.5 / 9876
-                viserr = 0.5 / 9876
-            
+        interr = self._cached('interr', lambda: _INT_ERR[self._gain[:self._n]].mean())  # rounding error of each value, averaged over the trial
+        fullerr = interr
+        irerr = interr
+        viserr = interr
+        
         return fullerr, irerr, viserr
     
     def totalError(self):
@@ -380,23 +830,21 @@ class LightSensor:
         errfull, errir, errvis = self.fluctuationError()
         fullerr, irerr, viserr = self.integerError()
         
-        ferrtot = np.sqrt((errfull ** 2) + (fullerr ** 2))
-        ierrtot = np.sqrt((errir ** 2) + (irerr ** 2))
-        verrtot = np.sqrt((errvis ** 2) + (viserr ** 2))
+        ferrtot = np.hypot(errfull, fullerr)  # added in quadrature
+        ierrtot = np.hypot(errir, irerr)
+        verrtot = np.hypot(errvis, viserr)
         
         return ferrtot, ierrtot, verrtot
         
     def listclear(self):
-        """Clear the list variables of all values.
+        """Clear the stored values.
         
-        This function clears each of the list variables of any values contained.
+        This function empties the buffers, including the gain history. The buffers keep their capacity,
+        so the next collection does not need to allocate them again.
         """
         
-        self.fullvals.clear()
-        self.irvals.clear()
-        self.visvals.clear()
-        self.timevals.clear()
-        self.gainhist.clear()
+        self._n = 0
+        self._epoch += 1
         
     def printHelp(self, name, full, ferr, ir, ierr, vis, verr):
         """Helper function to contain the format to print intensity values.
@@ -413,10 +861,10 @@ class LightSensor:
         verr (float): The error of the visible spectrum value
         """
         
-        print(name)
-        print('Full: %f ± %f' % (full, ferr))
-        print('IR: %f ± %f' % (ir, ierr))
-        print('Visible: %f ± %f' % (vis, verr))
+        print(f'{name}\n'
+              f'Full: {full:f} ± {ferr:f}\n'
+              f'IR: {ir:f} ± {ierr:f}\n'
+              f'Visible: {vis:f} ± {verr:f}')  # a single write for all four lines
         
     def getBackground(self):
         """Get the background values.
@@ -436,7 +884,7 @@ class LightSensor:
         self.printHelp('Background', self.bfull, self.bferr, self.bir, self.bierr, self.bvis, self.bverr)
     
     def getAverage(self): 
-        """Get the average and error of the current intensities in the lists.
+        """Get the average and error of the current intensities in the buffers.
         
         This function retrieves the current intensity averages and errors, which can then be
         stored into variables and used by the user."""
@@ -446,7 +894,7 @@ class LightSensor:
         return fullavg, iravg, visavg, ferr, ierr, verr
     
     def printAverage(self):
-        """Print the average and error of the current intensities in the lists.
+        """Print the average and error of the current intensities in the buffers.
         
         This function uses the format provided by the printHelp function to print the current intensity
         averages and errors in an easy to see format."""
@@ -455,12 +903,12 @@ class LightSensor:
         self.printHelp('Average', full, ferr, ir, ierr, vis, verr)
     
     def getRecent(self):
-        """Get the most recent values stored in the lists.
+        """Get the most recent values stored in the buffers.
         
-        This function gets the most recent values stored in the list variables. It should be noted that if
-        the values contained in the list are needed, this function should be called and the lists stored in
-        a variable by the user before new data is collected as the list will then be cleared to account for 
-        new data.
+        This function gets the most recent values stored in the buffers. It should be noted that the arrays
+        returned share memory with the buffers, so if the values are needed, this function should be called
+        and the arrays copied by the user before new data is collected as the buffers will then be overwritten
+        to account for new data.
         """
         
         return self.fullvals, self.irvals, self.visvals, self.timevals
@@ -468,9 +916,9 @@ class LightSensor:
     def getGain(self):
         """Get the history of the gain values.
         
-        This function gets the history of the gain sent by the Arduino board and stored into a list. If these
-        values are needed, this function should be called before new data is collected as this list will then
-        be cleared to account for new data.
+        This function gets the history of the gain sent by the Arduino board and stored into a buffer. If these
+        values are needed, this function should be called before new data is collected as the buffer will then
+        be overwritten to account for new data.
         """
         
         return self.gainhist
\ No newline at end of file